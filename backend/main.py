@@ -8,16 +8,17 @@ load_dotenv()
 
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.staticfiles import StaticFiles
+from fastapi.responses import ORJSONResponse
 
 from routers import applications, cameras, violations, streams, video_feed, detections
-from streaming import STREAM_ROOT, stream_manager
+from streaming import stream_manager
 from fastapi import WebSocket
 from websocket_manager import manager
+from violation_writer import violation_writer
 
 logger = logging.getLogger(__name__)
 
-app = FastAPI(title="CCTV Analytics Platform")
+app = FastAPI(title="CCTV Analytics Platform", default_response_class=ORJSONResponse)
 
 # Signal handler for graceful shutdown
 def signal_handler(sig, frame):
@@ -79,10 +80,7 @@ app.include_router(violations.router)
 app.include_router(streams.router)
 app.include_router(video_feed.router)
 app.include_router(detections.router)
-
-# Serve HLS playlists/segments generated by ffmpeg
-STREAM_ROOT.mkdir(exist_ok=True)
-app.mount("/streams", StaticFiles(directory=STREAM_ROOT, check_dir=False), name="streams")
+app.include_router(streams.hls_router)
 
 
 @app.get("/")
@@ -114,9 +112,12 @@ async def test_ws():
 @app.on_event("startup")
 async def startup_event():
     from database import engine
-    from models import Base
+    from models import Base, upgrade_schema
     async with engine.begin() as conn:
         await conn.run_sync(Base.metadata.create_all)
+        await conn.run_sync(upgrade_schema)
+    violation_writer.start()
+    detections.start_cache_cleanup()
 
 
 @app.on_event("shutdown")
@@ -124,6 +125,10 @@ async def stop_streams():
     """Cleanup on application shutdown"""
     logger.info("Application shutting down, cleaning up resources...")
     stream_manager.stop_all()
+    await violation_writer.stop()
+    detections.stop_cache_cleanup()
+    
+    await video_feed.close_http_client()
     
     # Stop video feed processor if it exists
     from routers.video_feed import processor, processor_lock, processor_thread
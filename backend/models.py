@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Boolean, ForeignKey, DateTime, JSON
+from sqlalchemy import Column, Integer, String, Boolean, ForeignKey, DateTime, JSON, Float, Index, inspect, text, update
 from sqlalchemy.orm import relationship
 from sqlalchemy.ext.declarative import declarative_base
 from datetime import datetime
@@ -42,7 +42,44 @@ class Violation(Base):
     camera_id = Column(Integer, ForeignKey("cameras.id"))
     timestamp = Column(DateTime, default=datetime.utcnow)
     details = Column(JSON)  # Stores detection details (bbox, confidence, etc.)
+    confidence = Column(Float, index=True)  # Copy of details["confidence"] for filtering in SQL
     image_path = Column(String) # Path to the saved frame
 
-    application = relationship("Application")
-    camera = relationship("Camera")
+    # Lazy loads are an N+1 per listed row; load these with selectinload() instead
+    application = relationship("Application", lazy="raise_on_sql")
+    camera = relationship("Camera", lazy="raise_on_sql")
+
+    @property
+    def image_url(self):
+        """API URL serving this violation's image, or None if it has none."""
+        if not self.image_path:
+            return None
+        return f"/api/detections/images/{self.image_path.rsplit('/', 1)[-1]}"
+
+    __table_args__ = (
+        # Serves the newest-first listing, optionally filtered by camera
+        Index("ix_violations_ts_cam", timestamp.desc(), camera_id),
+    )
+
+
+def upgrade_schema(connection) -> None:
+    """
+    Add columns/indexes introduced after a database was first created.
+
+    create_all() only creates missing tables, so existing databases are patched
+    here. Idempotent; run via AsyncConnection.run_sync at startup.
+    """
+    violations = Violation.__table__
+    columns = {column["name"] for column in inspect(connection).get_columns("violations")}
+    if "confidence" not in columns:
+        connection.execute(text("ALTER TABLE violations ADD COLUMN confidence FLOAT"))
+        connection.execute(
+            update(violations).values(confidence=violations.c.details["confidence"].as_float())
+        )
+    # Rows without a numeric details["confidence"] count as 0.0, matching what
+    # the violation writer stores; keeps the confidence filter index-friendly
+    connection.execute(
+        update(violations).where(violations.c.confidence.is_(None)).values(confidence=0.0)
+    )
+    for index in violations.indexes:
+        index.create(connection, checkfirst=True)
@@ -1,6 +1,8 @@
 from fastapi import APIRouter, Depends, HTTPException
 from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import insert
 from sqlalchemy.future import select
+from types import MappingProxyType
 from typing import List, Dict, Any
 
 from database import get_db
@@ -12,12 +14,44 @@ router = APIRouter(
     tags=["applications"],
 )
 
+# Static responses for POST /{app_id}/select, built once at import.
+_APP_SELECT_RESPONSES = MappingProxyType({
+    # Application 1: Face Detection (renamed from Helmet Detection)
+    1: {
+        "message": "Face Detection selected",
+        "app_id": 1,
+        "cameras": ["C1", "C2", "C3"],
+        "status": "running"
+    },
+    # Application 2: Employee Counting (placeholder)
+    2: {
+        "message": "Employee Counting selected",
+        "app_id": 2,
+        "cameras": ["C4", "C5", "C6", "C7", "C8", "C9"],
+        "status": "running"
+    },
+    # Application 3: Box Counting (placeholder)
+    3: {
+        "message": "Box Counting selected",
+        "app_id": 3,
+        "cameras": ["C10", "C11", "C12", "C13"],
+        "status": "running"
+    },
+    # Application 4: Zone Intrusion (placeholder)
+    4: {
+        "message": "Zone Intrusion selected",
+        "app_id": 4,
+        "cameras": ["C14", "C15", "C16", "C17", "C18", "C19", "C20", "C21", "C22"],
+        "status": "running"
+    },
+})
+
 @router.post("/", response_model=ApplicationSchema)
 async def create_application(app: ApplicationCreate, db: AsyncSession = Depends(get_db)):
-    db_app = Application(**app.dict())
-    db.add(db_app)
+    # INSERT ... RETURNING fetches the generated id/defaults in the same round-trip
+    result = await db.execute(insert(Application).values(**app.dict()).returning(Application))
+    db_app = result.scalar_one()
     await db.commit()
-    await db.refresh(db_app)
     return db_app
 
 @router.get("/", response_model=List[ApplicationSchema])
@@ -34,7 +68,7 @@ async def read_application(app_id: int, db: AsyncSession = Depends(get_db)):
         raise HTTPException(status_code=404, detail="Application not found")
     return app
 
-@router.post("/{app_id}/select")
+@router.post("/{app_id}/select", response_model=None)
 async def select_application(app_id: int) -> Dict[str, Any]:
     """
     Select application and return its camera configuration.
@@ -52,37 +86,7 @@ async def select_application(app_id: int) -> Dict[str, Any]:
         "status": "running"
     }
     """
-    # Application 1: Face Detection (renamed from Helmet Detection)
-    if app_id == 1:
-        return {
-            "message": "Face Detection selected",
-            "app_id": 1,
-            "cameras": ["C1", "C2", "C3"],
-            "status": "running"
-        }
-    # Application 2: Employee Counting (placeholder)
-    elif app_id == 2:
-        return {
-            "message": "Employee Counting selected",
-            "app_id": 2,
-            "cameras": ["C4", "C5", "C6", "C7", "C8", "C9"],
-            "status": "running"
-        }
-    # Application 3: Box Counting (placeholder)
-    elif app_id == 3:
-        return {
-            "message": "Box Counting selected",
-            "app_id": 3,
-            "cameras": ["C10", "C11", "C12", "C13"],
-            "status": "running"
-        }
-    # Application 4: Zone Intrusion (placeholder)
-    elif app_id == 4:
-        return {
-            "message": "Zone Intrusion selected",
-            "app_id": 4,
-            "cameras": ["C14", "C15", "C16", "C17", "C18", "C19", "C20", "C21", "C22"],
-            "status": "running"
-        }
-    else:
+    response = _APP_SELECT_RESPONSES.get(app_id)
+    if response is None:
         raise HTTPException(status_code=404, detail="Application not found")
+    return response
@@ -1,5 +1,6 @@
 from fastapi import APIRouter, Depends, HTTPException
 from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import insert
 from sqlalchemy.future import select
 from typing import List
 
@@ -14,10 +15,10 @@ router = APIRouter(
 
 @router.post("/", response_model=CameraSchema)
 async def create_camera(camera: CameraCreate, db: AsyncSession = Depends(get_db)):
-    db_camera = Camera(**camera.dict())
-    db.add(db_camera)
+    # INSERT ... RETURNING fetches the generated id/defaults in the same round-trip
+    result = await db.execute(insert(Camera).values(**camera.dict()).returning(Camera))
+    db_camera = result.scalar_one()
     await db.commit()
-    await db.refresh(db_camera)
     return db_camera
 
 @router.get("/", response_model=List[CameraSchema])
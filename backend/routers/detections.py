@@ -2,10 +2,12 @@
 Router for serving detection images and related endpoints.
 Handles static file serving for face detection thumbnails.
 """
+import asyncio
+import functools
 import os
-import shutil
 import time
 from pathlib import Path
+from typing import Dict, Optional
 from fastapi import APIRouter, HTTPException
 from fastapi.responses import FileResponse
 
@@ -26,33 +28,133 @@ DETECTION_IMAGE_PATHS = [
     BASE_DIR / "unknown_faces",
 ]
 
-# Ensure folders exist so we can resolve files cleanly.
-for path in DETECTION_IMAGE_PATHS:
-    path.mkdir(parents=True, exist_ok=True)
-
 CACHE_DIR = BASE_DIR / "thumbnail_cache"
-CACHE_DIR.mkdir(parents=True, exist_ok=True)
 CACHE_TTL_SECONDS = int(os.getenv("THUMBNAIL_CACHE_TTL_SECONDS", "21600"))  # 6 hours
+CACHE_HEADERS = {"Cache-Control": "public, max-age=3600"}
+
+# Per-directory filename -> path index, rebuilt with one os.scandir() when the
+# directory's mtime changes. Detection filenames embed a timestamp and are never
+# rewritten, so an unchanged directory means an unchanged index.
+_dir_index: Dict[Path, Dict[str, Path]] = {}
+_index_mtimes: Dict[Path, int] = {}
+_cleanup_task: Optional[asyncio.Task] = None
+
+
+@functools.lru_cache(maxsize=1)
+def _ensure_dirs() -> None:
+    """Create the image/cache folders on first use rather than at import time."""
+    for path in DETECTION_IMAGE_PATHS:
+        path.mkdir(parents=True, exist_ok=True)
+    CACHE_DIR.mkdir(parents=True, exist_ok=True)
 
 
 def _cleanup_cache() -> None:
     now = time.time()
     for cached in CACHE_DIR.glob("*.jpg"):
         try:
-            if now - cached.stat().st_mtime > CACHE_TTL_SECONDS:
+            # Cache entries are links: lstat so dangling symlinks are swept too, and
+            # use ctime since a hardlink shares (old) mtime with its source.
+            st = cached.lstat()
+            if now - max(st.st_mtime, st.st_ctime) > CACHE_TTL_SECONDS:
                 cached.unlink()
         except OSError:
             pass
 
 
-def resolve_detection_image_path(filename: str) -> Path | None:
-    for detection_dir in DETECTION_IMAGE_PATHS:
-        image_path = detection_dir / filename
-        if image_path.exists() and image_path.is_file():
+def _link_into_cache(source: Path, cached_path: Path) -> None:
+    """Expose source under the cache dir without copying any bytes."""
+    try:
+        # Drop a dangling link left behind by a deleted source
+        os.unlink(cached_path)
+    except FileNotFoundError:
+        pass
+    try:
+        os.link(source, cached_path)
+    except OSError:
+        # Different filesystem (or no hardlink support): fall back to a symlink
+        os.symlink(source, cached_path)
+
+
+async def _cleanup_cache_periodically() -> None:
+    # At most one sweep per minute, however short the TTL
+    interval = max(60.0, CACHE_TTL_SECONDS / 10)
+    while True:
+        await asyncio.to_thread(_cleanup_cache)
+        await asyncio.sleep(interval)
+
+
+def start_cache_cleanup() -> None:
+    """Sweep expired thumbnails in the background instead of on every request."""
+    global _cleanup_task
+    if _cleanup_task is None:
+        _cleanup_task = asyncio.create_task(_cleanup_cache_periodically(), name="thumbnail-cache-cleanup")
+
+
+def stop_cache_cleanup() -> None:
+    global _cleanup_task
+    if _cleanup_task is not None:
+        _cleanup_task.cancel()
+        _cleanup_task = None
+
+
+def _refresh_index() -> None:
+    now_ns = time.time_ns()
+    for directory in DETECTION_IMAGE_PATHS:
+        try:
+            mtime = os.stat(directory).st_mtime_ns
+        except OSError:
+            _dir_index.pop(directory, None)
+            _index_mtimes.pop(directory, None)
+            continue
+        if _index_mtimes.get(directory) == mtime:
+            continue
+        try:
+            with os.scandir(directory) as entries:
+                _dir_index[directory] = {
+                    entry.name: Path(entry.path) for entry in entries if entry.is_file()
+                }
+        except OSError:
+            continue
+        # On filesystems with coarse timestamps a file added within the same tick
+        # would not bump mtime again, so only trust mtimes that are a second old.
+        if now_ns - mtime > 1_000_000_000:
+            _index_mtimes[directory] = mtime
+        else:
+            _index_mtimes.pop(directory, None)
+
+
+def _lookup(filename: str) -> Path | None:
+    # Directories are checked in priority order: inference/* > root-level
+    for directory in DETECTION_IMAGE_PATHS:
+        image_path = _dir_index.get(directory, {}).get(filename)
+        if image_path is not None:
             return image_path
     return None
 
 
+def _forget(filename: str) -> None:
+    for entries in _dir_index.values():
+        entries.pop(filename, None)
+
+
+def resolve_detection_image_path(filename: str) -> Path | None:
+    image_path = _lookup(filename)
+    if image_path is None:
+        # Unknown name: pick up new files (at most one stat per directory)
+        _refresh_index()
+        image_path = _lookup(filename)
+    return image_path
+
+
+def _image_response(path: Path, stat_result: Optional[os.stat_result] = None) -> FileResponse:
+    return FileResponse(
+        path,
+        stat_result=stat_result,
+        media_type="image/jpeg",
+        headers=CACHE_HEADERS,
+    )
+
+
 @router.get("/images/{filename}")
 async def get_detection_image(filename: str):
     """
@@ -68,31 +170,28 @@ async def get_detection_image(filename: str):
     if ".." in filename or "/" in filename or "\\" in filename:
         raise HTTPException(status_code=400, detail="Invalid filename")
     
-    _cleanup_cache()
+    _ensure_dirs()
 
     cached_path = CACHE_DIR / filename
-    if cached_path.exists():
-        return FileResponse(
-            cached_path,
-            media_type="image/jpeg",
-            headers={"Cache-Control": "public, max-age=3600"},
-        )
+    try:
+        # One stat() both checks existence and feeds FileResponse.
+        return _image_response(cached_path, os.stat(cached_path))
+    except OSError:
+        pass
 
     image_path = resolve_detection_image_path(filename)
     if image_path:
         try:
-            shutil.copy2(image_path, cached_path)
-            return FileResponse(
-                cached_path,
-                media_type="image/jpeg",
-                headers={"Cache-Control": "public, max-age=3600"},
-            )
+            image_stat = os.stat(image_path)
         except OSError:
-            return FileResponse(
-                image_path,
-                media_type="image/jpeg",
-                headers={"Cache-Control": "public, max-age=3600"},
-            )
+            # Source disappeared since it was indexed
+            _forget(filename)
+        else:
+            try:
+                _link_into_cache(image_path, cached_path)
+            except OSError:
+                pass  # Cache is best-effort; the source is served directly either way
+            return _image_response(image_path, image_stat)
     
     # Image not found - return 404
     raise HTTPException(status_code=404, detail="Image not found")
@@ -1,14 +1,27 @@
 import os
 
 from fastapi import APIRouter, HTTPException
+from fastapi.responses import FileResponse, Response
 
-from streaming import stream_manager
+from streaming import STREAM_ROOT, stream_manager
 
 router = APIRouter(
     prefix="/api/streams",
     tags=["streams"],
 )
 
+# Serves the HLS playlists/segments generated by ffmpeg
+hls_router = APIRouter(
+    prefix="/streams",
+    tags=["streams"],
+)
+
+# Playlists change every segment; segments are immutable for their short lifetime
+HLS_MEDIA_TYPES = {
+    ".m3u8": ("application/vnd.apple.mpegurl", {"Cache-Control": "no-cache"}),
+    ".ts": ("video/mp2t", {"Cache-Control": "public, max-age=6"}),
+}
+
 
 def _get_c1_rtsp_url() -> str:
     url = os.getenv("C1_RTSP_URL")
@@ -42,10 +55,50 @@ async def start_c1_stream():
 @router.get("/c1/status")
 async def c1_status():
     running = stream_manager.is_running("c1")
-    return {"running": running, "hls": "/streams/c1/index.m3u8" if running else None}
+    return {"running": running, "hls": stream_manager.playlist_url("c1") if running else None}
 
 
 @router.post("/{name}/stop")
 async def stop_stream(name: str):
     stream_manager.stop_stream(name)
     return {"stopped": name}
+
+
+@hls_router.api_route("/{name}/{filename}", methods=["GET", "HEAD"])
+async def get_hls_file(name: str, filename: str):
+    """
+    Serve an HLS playlist or segment.
+
+    Unlike the old StaticFiles mount, this does a single stat() and only exposes
+    playlists and segments (not ffmpeg_debug.log). FileResponse hands the path
+    to servers supporting the ASGI pathsend extension for zero-copy sending;
+    see the README for fronting /streams with nginx sendfile.
+    """
+    # Security: Prevent directory traversal
+    for part in (name, filename):
+        if part.startswith(".") or "/" in part or "\\" in part:
+            raise HTTPException(status_code=400, detail="Invalid path")
+
+    media = HLS_MEDIA_TYPES.get(os.path.splitext(filename)[1])
+    if media is None:
+        raise HTTPException(status_code=404, detail="Not found")
+    media_type, headers = media
+
+    # Aliased names share their owner's ffmpeg output directory
+    owner = stream_manager.resolve(name)
+    if filename == "index.m3u8":
+        # Playlists are tiny and re-fetched every segment: one threaded read beats
+        # FileResponse's stat/open/read/close round-trips
+        try:
+            playlist = await stream_manager.read_playlist(owner)
+        except OSError:
+            raise HTTPException(status_code=404, detail="Not found")
+        return Response(playlist, media_type=media_type, headers=headers)
+
+    path = STREAM_ROOT / owner / filename
+    try:
+        stat_result = os.stat(path)
+    except OSError:
+        raise HTTPException(status_code=404, detail="Not found")
+
+    return FileResponse(path, stat_result=stat_result, media_type=media_type, headers=headers)
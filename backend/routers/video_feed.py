@@ -6,11 +6,14 @@ from pathlib import Path
 import json
 import cv2
 import threading
+import queue
 import asyncio
 import logging
 import time
-import requests
-from typing import Dict, Tuple
+import httpx
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Optional, Set, Tuple
 from fastapi import APIRouter
 from fastapi.responses import StreamingResponse
 
@@ -22,6 +25,13 @@ from fastapi.responses import StreamingResponse
 sys.path.append(str(Path(__file__).resolve().parent.parent.parent))
 
 import inference.processor as inference_processor
+from violation_writer import violation_writer
+
+try:
+    from turbojpeg import TurboJPEG, TJPF_BGR, TJSAMP_420
+    _tj = TurboJPEG()
+except Exception:  # PyTurboJPEG or the libjpeg-turbo shared library is missing
+    _tj = None
 
 logger = logging.getLogger(__name__)
 
@@ -35,14 +45,71 @@ processor = None
 processor_lock = threading.Lock()
 processor_thread = None  # Track the processor thread for cleanup
 
+# Dev-only: reload inference/processor.py and verify its source when the MJPEG
+# processor is (re)built. Costs file I/O + parsing, so it is off unless requested.
+_SOURCE_CHECK = os.getenv("MJPEG_SOURCE_CHECK") == "1"
+_source_checked = False
+
 # Emit violations from the MJPEG processor so detections show up in the UI.
 # Can be disabled if the separate inference service is already posting.
 EMIT_VIOLATIONS = os.getenv("VIDEO_FEED_EMIT_VIOLATIONS", "1") != "0"
 LOG_VIOLATIONS = os.getenv("VIDEO_FEED_LOG_VIOLATIONS", "0") == "1"
-VIOLATION_API_BASE = os.getenv("BACKEND_URL", "http://127.0.0.1:8000").rstrip("/")
+# Violations are handed straight to this process's violation writer. Set BACKEND_URL
+# only to forward them over HTTP to a different backend instance instead.
+VIOLATION_API_BASE = os.getenv("BACKEND_URL", "").rstrip("/")
+# Shared keep-alive (HTTP/2) client for forwarding, created on first use
+_http_client: Optional[httpx.AsyncClient] = None
 VIOLATION_EMIT_INTERVAL = float(os.getenv("VIOLATION_EMIT_INTERVAL", "5"))
-_last_violation_emit: Dict[Tuple[str, str], float] = {}
-_last_violation_lock = threading.Lock()
+# (camera_id, name) -> time.monotonic() of the last emit. No lock: each camera is
+# driven by a single processor thread, so a key is never updated concurrently,
+# and single-key dict get/set is atomic under the GIL anyway.
+_last_violation_emit: Dict[Tuple[int, str], float] = {}
+
+# MJPEG encode settings: quality 85 with 4:2:0 chroma subsampling is visually close
+# to 95/4:4:4 for CCTV content at ~40% of the bytes per frame.
+MJPEG_QUALITY = 85
+_CV2_JPEG_PARAMS = [
+    cv2.IMWRITE_JPEG_QUALITY, MJPEG_QUALITY,
+    cv2.IMWRITE_JPEG_SAMPLING_FACTOR, cv2.IMWRITE_JPEG_SAMPLING_FACTOR_420,
+]
+
+
+# JPEG encoding is CPU-bound and releases the GIL, so it runs on a thread pool
+# instead of the event loop. Each client buffers at most FRAME_QUEUE_SIZE frames.
+_encode_pool = ThreadPoolExecutor(max_workers=os.cpu_count() or 4, thread_name_prefix="mjpeg-encode")
+FRAME_QUEUE_SIZE = 2
+# Stream stats time 1 in 32 encodes (frame_count & mask == 0)
+ENCODE_SAMPLE_MASK = 31
+
+
+# Multipart boundary + part headers, up to the per-frame Content-Length value
+_FRAME_HEADER = b'--frame\r\nContent-Type: image/jpeg\r\nContent-Length: '
+_FRAME_TRAILER = b'\r\n\r\n'
+
+
+def _encode_jpeg(frame):
+    """
+    Encode a BGR frame to JPEG, using libjpeg-turbo's SIMD path when available.
+
+    Returns a bytes-like object (bytes or a 1-D uint8 array), or None on failure.
+    """
+    if _tj is not None:
+        return _tj.encode(frame, quality=MJPEG_QUALITY, pixel_format=TJPF_BGR, jpeg_subsample=TJSAMP_420)
+    ret, buffer = cv2.imencode('.jpg', frame, _CV2_JPEG_PARAMS)
+    return buffer.ravel() if ret else None
+
+
+def _encode_part(frame) -> Optional[bytes]:
+    """
+    Encode a frame and wrap it as one complete multipart/x-mixed-replace part.
+
+    Built once per frame (on the encode pool) and shared by every client, so each
+    client write is a single chunk instead of header/body/trailer writes.
+    """
+    buffer = _encode_jpeg(frame)
+    if buffer is None:
+        return None
+    return b"".join((_FRAME_HEADER, str(len(buffer)).encode(), b'\r\n\r\n', buffer, _FRAME_TRAILER))
 
 
 def _camera_id_to_int(camera_id) -> int:
@@ -53,29 +120,27 @@ def _camera_id_to_int(camera_id) -> int:
     return 1
 
 
-def _should_emit_violation(camera_id: str, name: str, now: float) -> bool:
-    key = (str(camera_id), str(name))
-    with _last_violation_lock:
-        last = _last_violation_emit.get(key, 0.0)
-        if now - last < VIOLATION_EMIT_INTERVAL:
-            return False
-        _last_violation_emit[key] = now
-        return True
+def _should_emit_violation(camera_id: int, name: str, now: float) -> bool:
+    key = (camera_id, name)
+    if now - _last_violation_emit.get(key, float("-inf")) < VIOLATION_EMIT_INTERVAL:
+        return False
+    _last_violation_emit[key] = now
+    return True
 
 
 def _emit_violation(data: dict) -> None:
     if not EMIT_VIOLATIONS:
         return
 
-    now = time.time()
+    now = time.monotonic()
     name = data.get("name", "Unknown")
-    camera_id = data.get("camera_id", "C1")
+    camera_id = _camera_id_to_int(data.get("camera_id", "C1"))
     if not _should_emit_violation(camera_id, name, now):
         return
 
     payload = {
         "app_id": 1,
-        "camera_id": _camera_id_to_int(camera_id),
+        "camera_id": camera_id,
         "details": data,
         "image_path": data.get("image_filename") or "",
     }
@@ -83,8 +148,37 @@ def _emit_violation(data: dict) -> None:
     if LOG_VIOLATIONS:
         logger.info("Emitting violation from MJPEG processor: %s", payload)
 
+    # Called from the processor's camera threads: hand the violation to the event
+    # loop and return immediately instead of blocking on the insert/request.
+    if VIOLATION_API_BASE:
+        loop = violation_writer.loop
+        if loop is None:
+            logger.warning("Event loop not running; dropping violation")
+            return
+        asyncio.run_coroutine_threadsafe(_forward_violation(payload), loop)
+        return
+
+    future = violation_writer.submit_threadsafe(payload)
+    if future is None:
+        logger.warning("Violation writer is not running; dropping violation")
+        return
+    future.add_done_callback(_log_emit_result)
+
+
+def _get_http_client() -> httpx.AsyncClient:
+    global _http_client
+    if _http_client is None:
+        _http_client = httpx.AsyncClient(
+            http2=True,
+            limits=httpx.Limits(max_keepalive_connections=32, keepalive_expiry=60),
+            timeout=2.0,
+        )
+    return _http_client
+
+
+async def _forward_violation(payload: dict) -> None:
     try:
-        resp = requests.post(f"{VIOLATION_API_BASE}/api/violations/", json=payload, timeout=2)
+        resp = await _get_http_client().post(f"{VIOLATION_API_BASE}/api/violations/", json=payload)
         if resp.status_code != 200:
             logger.warning("Violation emit failed: %s %s", resp.status_code, resp.text)
         elif LOG_VIOLATIONS:
@@ -92,18 +186,37 @@ def _emit_violation(data: dict) -> None:
     except Exception as exc:
         logger.warning("Violation emit error: %s", exc)
 
+
+async def close_http_client() -> None:
+    """Close the shared client used to forward violations to BACKEND_URL."""
+    global _http_client
+    if _http_client is not None:
+        await _http_client.aclose()
+        _http_client = None
+
+
+def _log_emit_result(future) -> None:
+    if future.cancelled():
+        return  # Writer shut down before the row was queued; exception() would raise
+    exc = future.exception()
+    if exc is not None:
+        logger.warning("Violation emit error: %s", exc)
+    elif LOG_VIOLATIONS:
+        logger.info("Violation emitted successfully")
+
 def get_processor():
     """
     Get or create processor instance for MJPEG streaming.
     Note: This is a fallback - ideally we'd read from the inference.main process,
     but since they're separate processes, we maintain our own instance here.
     """
-    global processor
+    global processor, _source_checked
     with processor_lock:
-        if processor is not None:
+        if processor is not None and _SOURCE_CHECK and not _source_checked:
+            _source_checked = True
             try:
                 src = inspect.getsource(processor.process_frame)
-                if "timestamp = datetime.now()" not in src:
+                if "timestamp = self._now_str()" not in src:
                     logger.warning("Detected stale processor code. Reinitializing MJPEG processor.")
                     try:
                         processor.stop()
@@ -128,14 +241,15 @@ def get_processor():
                 cameras = {"C1": rtsp_url}
                 
                 logger.info(f"Initializing Inference Processor for MJPEG streaming: {cameras}")
-                # Reload to pick up changes in inference/ without relying on uvicorn reload.
-                importlib.reload(inference_processor)
-                print(f"Using inference processor from {inference_processor.__file__}")
-                try:
-                    src = inspect.getsource(inference_processor.FaceRecognitionProcessor.process_frame)
-                    print(f"process_frame timestamp at top: {'timestamp = datetime.now()' in src}")
-                except Exception as exc:
-                    print(f"process_frame source check failed: {exc}")
+                if _SOURCE_CHECK:
+                    # Reload to pick up changes in inference/ without relying on uvicorn reload.
+                    importlib.reload(inference_processor)
+                    print(f"Using inference processor from {inference_processor.__file__}")
+                    try:
+                        src = inspect.getsource(inference_processor.FaceRecognitionProcessor.process_frame)
+                        print(f"process_frame timestamp at top: {'timestamp = self._now_str()' in src}")
+                    except Exception as exc:
+                        print(f"process_frame source check failed: {exc}")
                 processor = inference_processor.FaceRecognitionProcessor(
                     parameters=config["parameters"],
                     cameras=cameras,
@@ -158,99 +272,155 @@ def get_processor():
                 return None
     return processor
 
+class _CameraFeed:
+    """
+    Encodes one camera's processed frames once and fans them out to every MJPEG client.
+
+    A single pump task is the only consumer of the processor's latest-frame queue
+    for the camera, so clients never steal frames from each other. Encoding runs
+    on _encode_pool so it never blocks the event loop. Each client gets a small
+    bounded queue; if a client falls behind, its oldest queued frame is dropped
+    instead of letting frames pile up.
+    """
+
+    def __init__(self, proc, camera_id: str):
+        self.proc = proc
+        self.camera_id = camera_id
+        self.subscribers: Set[asyncio.Queue] = set()
+        self._task: Optional[asyncio.Task] = None
+
+    def subscribe(self) -> asyncio.Queue:
+        frames: asyncio.Queue = asyncio.Queue(maxsize=FRAME_QUEUE_SIZE)
+        self.subscribers.add(frames)
+        if self._task is None:
+            # The processor only annotates and publishes frames for watched cameras
+            self.proc.subscribers.add(self.camera_id)
+            self._task = asyncio.create_task(self._pump())
+        return frames
+
+    def unsubscribe(self, frames: asyncio.Queue) -> None:
+        self.subscribers.discard(frames)
+        if not self.subscribers and self._task is not None:
+            self.proc.subscribers.discard(self.camera_id)
+            self._task.cancel()
+            self._task = None
+
+    async def _pump(self):
+        camera_id = self.camera_id
+        loop = asyncio.get_running_loop()
+        frame_count = 0
+        consecutive_none_count = 0
+        
+        # Diagnostic tracking: only 1 in (ENCODE_SAMPLE_MASK + 1) frames is timed
+        last_log_time = time.perf_counter()
+        last_frame_count = 0
+        encoding_times = deque(maxlen=32)
+        
+        while True:
+            try:
+                # Take the newest frame, if the processor produced one since last time.
+                # SimpleQueue.get_nowait() needs no Python-level lock.
+                frame = None
+                source = self.proc.latest_frames.get(camera_id)
+                if source is not None:
+                    try:
+                        frame = source.get_nowait()
+                    except queue.Empty:
+                        pass
+                
+                if frame is not None:
+                    consecutive_none_count = 0
+                    
+                    # Log frame dimensions on first frame
+                    if frame_count == 0:
+                        h, w = frame.shape[:2]
+                        logger.info(f"🎥 {camera_id}: Streaming frame dimensions: {w}x{h}")
+                    
+                    sampled = (frame_count & ENCODE_SAMPLE_MASK) == 0
+                    if sampled:
+                        encode_start = time.perf_counter()
+                    
+                    # Encode to MJPEG (CPU-bound) in the encode pool
+                    part = await loop.run_in_executor(_encode_pool, _encode_part, frame)
+                    
+                    if part is not None:
+                        frame_count += 1
+                        
+                        if sampled:
+                            current_time = time.perf_counter()
+                            encoding_times.append(current_time - encode_start)
+                            
+                            # Log diagnostics every ~5 seconds (checked on sampled frames)
+                            if current_time - last_log_time >= 5.0:
+                                frames_sent = frame_count - last_frame_count
+                                avg_fps = frames_sent / (current_time - last_log_time)
+                                avg_encode_time = sum(encoding_times) / len(encoding_times)
+                                frame_size_kb = len(part) / 1024
+                                
+                                logger.info(
+                                    f"📊 {camera_id} Stream Stats - "
+                                    f"FPS: {avg_fps:.1f}, "
+                                    f"Encode: {avg_encode_time*1000:.1f}ms, "
+                                    f"Frame size: {frame_size_kb:.1f}KB, "
+                                    f"Total frames: {frame_count}, "
+                                    f"Clients: {len(self.subscribers)}"
+                                )
+                                
+                                last_log_time = current_time
+                                last_frame_count = frame_count
+                        
+                        for frames in self.subscribers:
+                            if frames.full():
+                                # Slow client: drop its oldest frame rather than queueing up
+                                frames.get_nowait()
+                            frames.put_nowait(part)
+                else:
+                    # No new frame yet, wait a bit longer
+                    consecutive_none_count += 1
+                    if consecutive_none_count > 10:
+                        # Log occasionally if frames are missing
+                        if consecutive_none_count % 50 == 0:
+                            logger.debug(f"Camera {camera_id}: Still waiting for frames...")
+                        await asyncio.sleep(0.1)
+                
+                # Non-blocking sleep - doesn't freeze server
+                await asyncio.sleep(0.04)  # ~25 FPS
+                    
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Error streaming {camera_id}: {e}", exc_info=True)
+                await asyncio.sleep(1)  # Wait before retrying
+
+
+_camera_feeds: Dict[str, _CameraFeed] = {}
+
+
 async def generate_frames(camera_id: str):
     """
     Generate MJPEG frames from processor's annotated output.
     Uses async/await to avoid blocking the FastAPI event loop.
     """
-    import time as time_module
-    
     proc = get_processor()
     if not proc:
         logger.warning(f"No processor available for camera: {camera_id}")
         return
     
-    frame_count = 0
-    consecutive_none_count = 0
-    
-    # Diagnostic tracking
-    last_log_time = time_module.time()
-    last_frame_count = 0
-    encoding_times = []
-    
-    while True:
-        try:
-            # Non-blocking sleep - doesn't freeze server
-            await asyncio.sleep(0.04)  # ~25 FPS
-            
-            frame = None
-            # Access frame safely using the processor's lock
-            # Note: threading.Lock is used here, but we're in async context.
-            # Since we're just reading briefly, this should be okay.
-            # For production, consider using asyncio.to_thread() to wrap the lock access.
-            with proc.lock:
-                frame = proc.latest_frames.get(camera_id)
-            
-            if frame is not None:
-                consecutive_none_count = 0
-                
-                # Log frame dimensions on first frame
-                if frame_count == 0:
-                    h, w = frame.shape[:2]
-                    logger.info(f"🎥 {camera_id}: Streaming frame dimensions: {w}x{h}")
-                
-                # Measure encoding time for diagnostics
-                encode_start = time_module.time()
-                
-                # Encode to MJPEG with high quality (95 for better clarity)
-                # This is CPU-bound, but necessary for quality
-                ret, buffer = cv2.imencode('.jpg', frame, [cv2.IMWRITE_JPEG_QUALITY, 95])
-                
-                encode_time = time_module.time() - encode_start
-                encoding_times.append(encode_time)
-                
-                if ret:
-                    frame_count += 1
-                    frame_size_kb = len(buffer.tobytes()) / 1024
-                    
-                    # Log diagnostics every 5 seconds
-                    current_time = time_module.time()
-                    if current_time - last_log_time >= 5.0:
-                        frames_sent = frame_count - last_frame_count
-                        avg_fps = frames_sent / (current_time - last_log_time)
-                        avg_encode_time = sum(encoding_times[-frames_sent:]) / max(frames_sent, 1) if frames_sent > 0 else 0
-                        avg_frame_size = sum([len(encoding_times)])  # Simplified
-                        
-                        logger.info(
-                            f"📊 {camera_id} Stream Stats - "
-                            f"FPS: {avg_fps:.1f}, "
-                            f"Encode: {avg_encode_time*1000:.1f}ms, "
-                            f"Frame size: {frame_size_kb:.1f}KB, "
-                            f"Total frames: {frame_count}"
-                        )
-                        
-                        last_log_time = current_time
-                        last_frame_count = frame_count
-                        encoding_times = encoding_times[-30:]  # Keep last 30 measurements
-                    
-                    yield (b'--frame\r\n'
-                           b'Content-Type: image/jpeg\r\n\r\n' + 
-                           buffer.tobytes() + b'\r\n\r\n')
-            else:
-                # No frame yet, wait a bit longer
-                consecutive_none_count += 1
-                if consecutive_none_count > 10:
-                    # Log occasionally if frames are missing
-                    if consecutive_none_count % 50 == 0:
-                        logger.debug(f"Camera {camera_id}: Still waiting for frames...")
-                    await asyncio.sleep(0.1)
-                
-        except GeneratorExit:
-            logger.info(f"Camera {camera_id} stream closed (client disconnected)")
-            break
-        except Exception as e:
-            logger.error(f"Error streaming {camera_id}: {e}", exc_info=True)
-            await asyncio.sleep(1)  # Wait before retrying
+    feed = _camera_feeds.get(camera_id)
+    if feed is None or feed.proc is not proc:
+        feed = _camera_feeds[camera_id] = _CameraFeed(proc, camera_id)
+    frames = feed.subscribe()
+    try:
+        while True:
+            # One pre-built part per frame -> one body chunk / write per frame
+            yield await frames.get()
+    except GeneratorExit:
+        logger.info(f"Camera {camera_id} stream closed (client disconnected)")
+        raise
+    finally:
+        feed.unsubscribe(frames)
+        if not feed.subscribers and _camera_feeds.get(camera_id) is feed:
+            del _camera_feeds[camera_id]
 
 @router.get("/{camera_id}")
 async def video_feed(camera_id: str):
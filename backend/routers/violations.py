@@ -1,5 +1,3 @@
-import os
-from pathlib import Path
 from fastapi import APIRouter, Depends, HTTPException, Query
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.future import select
@@ -10,6 +8,7 @@ from datetime import datetime, timedelta
 from database import get_db
 from models import Violation
 from schemas import Violation as ViolationSchema, ViolationCreate
+from violation_writer import violation_writer
 
 router = APIRouter(
     prefix="/api/violations",
@@ -18,49 +17,26 @@ router = APIRouter(
 
 
 @router.post("/", response_model=ViolationSchema)
-async def create_violation(violation: ViolationCreate, db: AsyncSession = Depends(get_db)):
+async def create_violation(violation: ViolationCreate):
     """
     Create a new violation/detection record.
+
+    The row is queued on the shared violation writer, which batches concurrent
+    inserts; the WebSocket broadcast is scheduled after commit and does not
+    delay this response.
     """
-    db_violation = Violation(**violation.dict())
-    db.add(db_violation)
-    await db.commit()
-    await db.refresh(db_violation)
-    
-    # Construct image URL for WebSocket broadcast
-    image_url = None
-    if db_violation.image_path:
-        filename = os.path.basename(db_violation.image_path)
-        image_url = f"/api/detections/images/{filename}"
-    
-    # Broadcast to WebSocket clients
-    import json
-    from websocket_manager import manager
-    await manager.broadcast(json.dumps({
-        "type": "violation",
-        "data": {
-            "id": db_violation.id,
-            "app_id": db_violation.app_id,
-            "camera_id": db_violation.camera_id,
-            "details": db_violation.details,
-            "timestamp": db_violation.timestamp.isoformat(),
-            "image_path": db_violation.image_path,
-            "image_url": image_url
-        }
-    }))
-    
-    # Return violation with image_url
-    violation_dict = {
-        "id": db_violation.id,
-        "app_id": db_violation.app_id,
-        "camera_id": db_violation.camera_id,
-        "timestamp": db_violation.timestamp,
-        "details": db_violation.details,
-        "image_path": db_violation.image_path,
-        "image_url": image_url
-    }
-    
-    return violation_dict
+    return await violation_writer.submit(violation.dict())
+
+@router.post("/batch", response_model=List[ViolationSchema])
+async def create_violations(violations: List[ViolationCreate]):
+    """
+    Create several violation records in one request.
+
+    The rows are validated up front and inserted in one transaction, so the
+    batch is stored completely or not at all and a failed request can be
+    retried without creating duplicates.
+    """
+    return await violation_writer.submit_batch([violation.dict() for violation in violations])
 
 @router.get("/", response_model=List[ViolationSchema])
 async def read_violations(
@@ -94,56 +70,17 @@ async def read_violations(
         time_threshold = datetime.utcnow() - timedelta(hours=hours)
         conditions.append(Violation.timestamp >= time_threshold)
     
+    # Filter by confidence (indexed column mirrored from details["confidence"];
+    # stored as 0.0 when missing, so a threshold of 0 matches every row)
+    if min_confidence is not None and min_confidence > 0:
+        conditions.append(Violation.confidence >= min_confidence)
+    
     # Apply conditions
     if conditions:
         query = query.where(and_(*conditions))
     
-    # Filter by confidence (requires parsing details JSON)
-    # Note: This is a simplified approach. For better performance with large datasets,
-    # consider storing confidence as a separate column or using a JSONB query.
-    if min_confidence is not None:
-        # We'll filter in Python after fetching, as SQLAlchemy JSON filtering can be complex
-        # For production, consider adding a confidence column to the Violation model
-        pass
-    
     # Order by timestamp (newest first) and apply pagination
     query = query.order_by(Violation.timestamp.desc()).offset(skip).limit(limit)
     
     result = await db.execute(query)
-    violations = result.scalars().all()
-    
-    # Filter by confidence if specified (post-query filtering)
-    if min_confidence is not None:
-        filtered_violations = []
-        for violation in violations:
-            if violation.details and isinstance(violation.details, dict):
-                conf = violation.details.get("confidence", 0.0)
-                if isinstance(conf, (int, float)) and conf >= min_confidence:
-                    filtered_violations.append(violation)
-        violations = filtered_violations
-    
-    # Enhance violations with full image URLs
-    enhanced_violations = []
-    for violation in violations:
-        # Convert violation to dict for modification
-        violation_dict = {
-            "id": violation.id,
-            "app_id": violation.app_id,
-            "camera_id": violation.camera_id,
-            "timestamp": violation.timestamp,
-            "details": violation.details,
-            "image_path": violation.image_path
-        }
-        
-        # Construct full image URL if image_path exists
-        if violation.image_path:
-            # Extract just the filename if it's a full path
-            filename = os.path.basename(violation.image_path)
-            # Construct the API URL
-            violation_dict["image_url"] = f"/api/detections/images/{filename}"
-        else:
-            violation_dict["image_url"] = None
-        
-        enhanced_violations.append(violation_dict)
-    
-    return enhanced_violations
+    return result.scalars().all()
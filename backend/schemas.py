@@ -42,6 +42,7 @@ class ViolationCreate(ViolationBase):
 class Violation(ViolationBase):
     id: int
     timestamp: datetime
+    image_url: Optional[str] = None
     
     class Config:
         orm_mode = True
@@ -1,12 +1,53 @@
+import asyncio
 import atexit
+import os
+import selectors
+import signal
 import subprocess
+import threading
+import time
 from pathlib import Path
 from threading import Lock
-from typing import Dict, Optional
+from typing import Dict, Iterable, Optional, Set, Tuple
+from urllib.parse import urlsplit, urlunsplit
 
-# Root folder where HLS playlists and segments will be written
-STREAM_ROOT = Path(__file__).resolve().parent / "streams"
-STREAM_ROOT.mkdir(exist_ok=True)
+# Root folder where HLS playlists and segments will be written. Segments are
+# short-lived, so default to tmpfs (/dev/shm) when present to keep the churn off
+# the disk; override with STREAM_ROOT.
+_DEFAULT_STREAM_ROOT = (
+    Path("/dev/shm/vision-hub-streams")
+    if Path("/dev/shm").is_dir()
+    else Path(__file__).resolve().parent / "streams"
+)
+STREAM_ROOT = Path(os.getenv("STREAM_ROOT", str(_DEFAULT_STREAM_ROOT)))
+STREAM_ROOT.mkdir(parents=True, exist_ok=True)
+
+
+# is_running() trusts its cached answer for up to this long, unless a child
+# process has exited (SIGCHLD) since it last checked
+STATUS_CHECK_INTERVAL = 0.5
+
+# Bumped by the SIGCHLD handler; a change means some child may have exited
+_child_exit_seq = 0
+
+
+def _install_sigchld_handler() -> bool:
+    """Count child exits via SIGCHLD. Only possible on POSIX, from the main thread."""
+    if not hasattr(signal, "SIGCHLD") or threading.current_thread() is not threading.main_thread():
+        return False
+    previous = signal.getsignal(signal.SIGCHLD)
+
+    def _on_sigchld(signum, frame):
+        global _child_exit_seq
+        _child_exit_seq += 1
+        if callable(previous):
+            previous(signum, frame)
+
+    signal.signal(signal.SIGCHLD, _on_sigchld)
+    return True
+
+
+_SIGCHLD_ACTIVE = _install_sigchld_handler()
 
 
 class StreamProcess:
@@ -16,21 +57,99 @@ class StreamProcess:
         self.name = name
         self.process = process
         self.output_dir = output_dir
+        # A pidfd becomes readable when the process exits, so many exits can be
+        # awaited with a single epoll (Linux >= 5.3)
+        self.pidfd: Optional[int] = None
+        if hasattr(os, "pidfd_open"):
+            try:
+                self.pidfd = os.pidfd_open(process.pid)
+            except OSError:
+                pass
+        self._running = True
+        self._checked_at = time.monotonic()
+        self._seen_exit_seq = _child_exit_seq
 
     @property
     def playlist_path(self) -> Path:
         return self.output_dir / "index.m3u8"
 
     def is_running(self) -> bool:
-        return self.process.poll() is None
+        now = time.monotonic()
+        if (
+            _SIGCHLD_ACTIVE
+            and self._running
+            and self._seen_exit_seq == _child_exit_seq
+            and now - self._checked_at < STATUS_CHECK_INTERVAL
+        ):
+            return True
+        # Read the counter before polling so an exit racing the poll is not lost
+        self._seen_exit_seq = _child_exit_seq
+        self._running = self.process.poll() is None
+        self._checked_at = now
+        return self._running
 
     def stop(self) -> None:
-        if self.process.poll() is None:
-            self.process.terminate()
-            try:
-                self.process.wait(timeout=5)
-            except subprocess.TimeoutExpired:
-                self.process.kill()
+        stop_processes([self])
+
+    def close(self) -> None:
+        if self.pidfd is not None:
+            os.close(self.pidfd)
+            self.pidfd = None
+
+
+def stop_processes(procs: Iterable[StreamProcess], timeout: float = 5) -> None:
+    """
+    Terminate all processes at once and wait for them under a shared deadline.
+
+    Exits are collected with one epoll over the processes' pidfds where
+    available; anything still alive when the deadline passes is killed.
+    """
+    procs = list(procs)
+    running = [proc for proc in procs if proc.process.poll() is None]
+    for proc in running:
+        proc.process.terminate()
+
+    deadline = time.monotonic() + timeout
+    waitable = [proc for proc in running if proc.pidfd is not None]
+    if waitable and hasattr(selectors, "EpollSelector"):
+        with selectors.EpollSelector() as selector:
+            for proc in waitable:
+                selector.register(proc.pidfd, selectors.EVENT_READ, proc)
+            pending = len(waitable)
+            while pending:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                for key, _ in selector.select(remaining):
+                    selector.unregister(key.fd)
+                    pending -= 1
+
+    for proc in running:
+        try:
+            # Returns immediately for processes the epoll already saw exit
+            proc.process.wait(timeout=max(0.0, deadline - time.monotonic()))
+        except subprocess.TimeoutExpired:
+            proc.process.kill()
+            proc.process.wait()
+    for proc in procs:
+        proc.close()
+
+
+# ffmpeg output is discarded unless VH_LOG_FFMPEG is set, in which case it is
+# appended to <stream>/ffmpeg_debug.log (restarted once it exceeds the cap)
+LOG_FFMPEG = bool(os.getenv("VH_LOG_FFMPEG"))
+FFMPEG_LOG_MAX_BYTES = 5 * 1024 * 1024
+
+
+def _normalize_rtsp_url(rtsp_url: str) -> str:
+    """Key identifying the physical camera: no credentials/fragment, lower-case host."""
+    parts = urlsplit(rtsp_url.strip())
+    host = (parts.hostname or "").lower()
+    if ":" in host:
+        host = f"[{host}]"  # IPv6 literal
+    if parts.port:
+        host = f"{host}:{parts.port}"
+    return urlunsplit((parts.scheme.lower(), host, parts.path, parts.query, ""))
 
 
 class StreamManager:
@@ -39,10 +158,32 @@ class StreamManager:
     def __init__(self, root: Path):
         self.root = root
         self._processes: Dict[str, StreamProcess] = {}
+        self._commands: Dict[Tuple[str, str], Tuple[str, ...]] = {}
+        self._url_cache: Dict[str, str] = {}
+        # Streams requested under different names for the same camera share one
+        # ffmpeg: camera key -> owning stream name, alias name -> owning name, and
+        # owning name -> every name currently using it.
+        self._by_url: Dict[str, str] = {}
+        self._aliases: Dict[str, str] = {}
+        self._consumers: Dict[str, Set[str]] = {}
+        # One lock per camera key so starting/stopping one camera never waits
+        # on another's ffmpeg launch; _lock only guards the dicts themselves.
+        self._stream_locks: Dict[str, Lock] = {}
         self._lock = Lock()
 
+    def _lock_for(self, camera_key: str) -> Lock:
+        with self._lock:
+            return self._stream_locks.setdefault(camera_key, Lock())
+
+    def _command(self, name: str, rtsp_url: str) -> Tuple[str, ...]:
+        """ffmpeg argv for a stream, built once per (name, rtsp_url)."""
+        key = (name, rtsp_url)
+        cmd = self._commands.get(key)
+        if cmd is None:
+            cmd = self._commands[key] = tuple(self._build_command(rtsp_url, self.root / name))
+        return cmd
+
     def _build_command(self, rtsp_url: str, output_dir: Path) -> list:
-        output_dir.mkdir(parents=True, exist_ok=True)
         playlist = output_dir / "index.m3u8"
         segments = output_dir / "segment_%05d.ts"
 
@@ -50,6 +191,11 @@ class StreamManager:
         return [
             "ffmpeg",
             "-nostdin",
+            # Only report errors; the default per-frame progress lines are pure I/O
+            "-hide_banner",
+            "-nostats",
+            "-loglevel",
+            "error",
             "-rtsp_transport",
             "tcp",
             "-i",
@@ -67,7 +213,9 @@ class StreamManager:
             "-hls_list_size",
             "5",
             "-hls_flags",
-            "delete_segments",
+            # temp_file: write segments/playlist under a temp name and rename
+            # when complete, so clients never fetch a partial segment
+            "delete_segments+temp_file",
             "-tag:v",
             "hvc1",
             "-hls_segment_filename",
@@ -80,46 +228,177 @@ class StreamManager:
         if not rtsp_url:
             raise ValueError("RTSP URL is required to start a stream")
 
+        camera_key = _normalize_rtsp_url(rtsp_url)
+        # A name moving to another camera gives up what it was using first
         with self._lock:
-            existing: Optional[StreamProcess] = self._processes.get(name)
-            if existing and existing.is_running():
-                return self._public_playlist_url(name)
+            current = self._aliases.get(name, name)
+            current_key = self._camera_key_of(current)
+        if current_key is not None and current_key != camera_key:
+            if current == name:
+                with self._lock_for(current_key):
+                    self._retire(name)
+            else:
+                self.stop_stream(name)
+
+        # Looking up the owner and registering a new one happen under the
+        # camera's lock, so two names racing for one camera start one ffmpeg
+        with self._lock_for(camera_key):
+            with self._lock:
+                owner = self._by_url.get(camera_key)
+            # Names still using a dead owner's camera; they follow the new process
+            orphans: Set[str] = set()
+            if owner is not None:
+                proc = self._processes.get(owner)
+                if proc and proc.is_running():
+                    if owner != name:
+                        # A process of our own would now be unreachable
+                        if name in self._processes:
+                            orphans = self._retire(name)
+                        with self._lock:
+                            consumers = self._consumers.setdefault(owner, set())
+                            for alias in orphans | {name}:
+                                self._aliases[alias] = owner
+                                consumers.add(alias)
+                    else:
+                        with self._lock:
+                            self._consumers.setdefault(name, set()).add(name)
+                    return self._public_playlist_url(owner)
+                orphans = self._retire(owner)
+            if owner != name and name in self._processes:
+                orphans |= self._retire(name)
+            orphans.discard(name)
 
             output_dir = self.root / name
-            cmd = self._build_command(rtsp_url, output_dir)
-            # Log ffmpeg output for debugging
-            log_file = output_dir / "ffmpeg_debug.log"
-            with open(log_file, "w") as f:
-                process = subprocess.Popen(
-                    cmd,
-                    stdout=f,
-                    stderr=subprocess.STDOUT,
-                )
-
-            self._processes[name] = StreamProcess(name, process, output_dir)
+            output_dir.mkdir(parents=True, exist_ok=True)
+            process = self._launch(self._command(name, rtsp_url), output_dir)
+            with self._lock:
+                self._processes[name] = StreamProcess(name, process, output_dir)
+                self._by_url[camera_key] = name
+                self._aliases.pop(name, None)
+                consumers = self._consumers.setdefault(name, set())
+                consumers.add(name)
+                for alias in orphans:
+                    self._aliases[alias] = name
+                    consumers.add(alias)
             return self._public_playlist_url(name)
 
+    def _camera_key_of(self, owner: str) -> Optional[str]:
+        """Camera key an owning stream was started for (caller holds _lock)."""
+        for camera_key, stream in self._by_url.items():
+            if stream == owner:
+                return camera_key
+        return None
+
+    def _retire(self, owner: str) -> Set[str]:
+        """
+        Stop an owner's process and forget its bookkeeping (caller holds its
+        camera's lock).
+
+        Returns the names that were still using it, the owner included, so the
+        replacement process can adopt them.
+        """
+        with self._lock:
+            proc = self._processes.pop(owner, None)
+            consumers = self._consumers.pop(owner, set())
+            self._url_cache.pop(owner, None)
+            for camera_key in [key for key, stream in self._by_url.items() if stream == owner]:
+                del self._by_url[camera_key]
+            for alias in [alias for alias, target in self._aliases.items() if target == owner]:
+                del self._aliases[alias]
+                consumers.add(alias)
+        if proc:
+            proc.stop()
+        return consumers
+
+    def _launch(self, cmd: Tuple[str, ...], output_dir: Path) -> subprocess.Popen:
+        # Plain fd redirections and no preexec_fn keep CPython on its vfork()
+        # spawn path instead of fork()ing (and page-table copying) the backend.
+        # start_new_session keeps a terminal Ctrl-C from killing ffmpeg before
+        # stop_all() shuts it down cleanly.
+        spawn_options = {"stdin": subprocess.DEVNULL, "close_fds": True, "start_new_session": True}
+        if not LOG_FFMPEG:
+            return subprocess.Popen(
+                cmd,
+                stdout=subprocess.DEVNULL,
+                stderr=subprocess.DEVNULL,
+                **spawn_options,
+            )
+
+        # Log ffmpeg output for debugging
+        log_file = output_dir / "ffmpeg_debug.log"
+        mode = "a"
+        try:
+            if log_file.stat().st_size > FFMPEG_LOG_MAX_BYTES:
+                mode = "w"
+        except OSError:
+            pass
+        with open(log_file, mode) as f:
+            return subprocess.Popen(
+                cmd,
+                stdout=f,
+                stderr=subprocess.STDOUT,
+                **spawn_options,
+            )
+
     def stop_stream(self, name: str) -> None:
+        """Release `name`; its ffmpeg is stopped once no other name shares it."""
         with self._lock:
-            proc = self._processes.pop(name, None)
+            owner = self._aliases.pop(name, name)
+            consumers = self._consumers.get(owner)
+            if consumers is not None:
+                consumers.discard(name)
+                if consumers:
+                    return
+
+            camera_key = self._camera_key_of(owner)
+
+        # Held while stopping so a restart can't overlap the old ffmpeg
+        with self._lock_for(camera_key or owner):
+            with self._lock:
+                proc = self._processes.pop(owner, None)
+                self._url_cache.pop(owner, None)
+                self._consumers.pop(owner, None)
+                for key in [key for key, stream in self._by_url.items() if stream == owner]:
+                    del self._by_url[key]
             if proc:
                 proc.stop()
 
     def stop_all(self) -> None:
         with self._lock:
-            names = list(self._processes.keys())
-        for name in names:
-            self.stop_stream(name)
+            procs = list(self._processes.values())
+            self._processes.clear()
+            self._by_url.clear()
+            self._aliases.clear()
+            self._consumers.clear()
+        stop_processes(procs)
 
     def is_running(self, name: str) -> bool:
-        proc = self._processes.get(name)
+        owner = self._aliases.get(name, name)
+        if name not in self._consumers.get(owner, ()):
+            return False  # Released, even if other names still share the process
+        proc = self._processes.get(owner)
         return bool(proc and proc.is_running())
 
-    def playlist_path(self, name: str) -> Path:
-        return (self.root / name) / "index.m3u8"
+    def resolve(self, name: str) -> str:
+        """Name of the stream whose ffmpeg serves `name` (itself unless aliased)."""
+        return self._aliases.get(name, name)
+
+    def playlist_url(self, name: str) -> str:
+        """Public playlist path for `name`, following an alias to its owner."""
+        return self._public_playlist_url(self.resolve(name))
+
+    def playlist_path(self, owner: str) -> Path:
+        return self.root / owner / "index.m3u8"
+
+    async def read_playlist(self, owner: str) -> bytes:
+        """Read a stream's playlist off the event loop. Raises OSError if missing."""
+        return await asyncio.to_thread(self.playlist_path(owner).read_bytes)
 
     def _public_playlist_url(self, name: str) -> str:
-        return f"/streams/{name}/index.m3u8"
+        url = self._url_cache.get(name)
+        if url is None:
+            url = self._url_cache[name] = f"/streams/{name}/index.m3u8"
+        return url
 
 
 stream_manager = StreamManager(STREAM_ROOT)
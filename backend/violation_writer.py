@@ -0,0 +1,231 @@
+import asyncio
+import concurrent.futures
+import logging
+from typing import Any, Dict, List, Optional, Set, Tuple, Union
+
+from sqlalchemy import insert
+
+from database import AsyncSessionLocal
+from models import Violation
+from websocket_manager import manager
+
+logger = logging.getLogger(__name__)
+
+# A batch is flushed when it reaches MAX_BATCH_SIZE rows or MAX_BATCH_DELAY
+# seconds after its first row arrived, whichever comes first.
+MAX_BATCH_SIZE = 1000
+MAX_BATCH_DELAY = 0.02
+
+_STOP = object()
+
+
+def _extract_confidence(details: Any) -> float:
+    # Missing/non-numeric confidence is stored as 0.0 (never NULL), so the
+    # min_confidence filter can compare the indexed column directly
+    if isinstance(details, dict):
+        confidence = details.get("confidence")
+        if isinstance(confidence, (int, float)):
+            return float(confidence)
+    return 0.0
+
+
+def _violations_event(violations: List[Violation]) -> Dict[str, Any]:
+    # One message per flushed batch; orjson serializes the datetimes natively
+    # (same ISO format as isoformat())
+    return {
+        "type": "violations",
+        "data": [
+            {
+                "id": violation.id,
+                "app_id": violation.app_id,
+                "camera_id": violation.camera_id,
+                "details": violation.details,
+                "timestamp": violation.timestamp,
+                "image_path": violation.image_path,
+                "image_url": violation.image_url
+            }
+            for violation in violations
+        ]
+    }
+
+
+class ViolationWriter:
+    """
+    Coalesces violation inserts into multi-row INSERT ... RETURNING batches.
+
+    Callers enqueue a row and await a future; a single background task drains
+    the queue, writes the whole batch in one round-trip and resolves each
+    caller's future with its persisted Violation. The WebSocket broadcast of the
+    batch runs as a separate task so it never delays the write path.
+    """
+
+    def __init__(self, max_batch_size: int = MAX_BATCH_SIZE, max_delay: float = MAX_BATCH_DELAY):
+        self.max_batch_size = max_batch_size
+        self.max_delay = max_delay
+        self._queue: Optional[asyncio.Queue] = None
+        self._task: Optional[asyncio.Task] = None
+        self.loop: Optional[asyncio.AbstractEventLoop] = None
+        # Set once stop() has queued _STOP; later rows bypass the queue
+        self._stopping = False
+        # Strong references to in-flight broadcast tasks so they aren't GC'd
+        self._broadcasts: Set[asyncio.Task] = set()
+
+    def start(self) -> None:
+        """Start the background flusher on the running event loop."""
+        if self._task is not None:
+            return
+        self.loop = asyncio.get_running_loop()
+        self._stopping = False
+        self._queue = asyncio.Queue()
+        self._task = asyncio.create_task(self._run(), name="violation-writer")
+
+    async def stop(self) -> None:
+        """Flush anything still queued and stop the background flusher."""
+        if self._task is None:
+            return
+        # Nothing may be queued behind _STOP: _run would exit without resolving it
+        self._stopping = True
+        await self._queue.put(_STOP)
+        try:
+            await self._task
+            if self._broadcasts:
+                await asyncio.gather(*self._broadcasts, return_exceptions=True)
+        finally:
+            self._task = None
+            self._queue = None
+            self.loop = None
+            self._stopping = False
+
+    async def submit(self, row: Dict[str, Any]) -> Violation:
+        """Queue a violation row and wait until it has been committed."""
+        if row.get("confidence") is None:
+            row = {**row, "confidence": _extract_confidence(row.get("details"))}
+        if self._task is None or self._stopping:
+            # Writer not running (e.g. startup hooks skipped) or shutting down: write directly.
+            violations = await self._insert([row])
+            self._schedule_broadcast(violations)
+            return violations[0]
+
+        future = asyncio.get_running_loop().create_future()
+        await self._queue.put((row, future))
+        return await future
+
+    async def submit_batch(self, rows: List[Dict[str, Any]]) -> List[Violation]:
+        """
+        Write several violations in one transaction: either every row is
+        committed or none is, so a failed request can be retried as a whole.
+        """
+        rows = [
+            row if row.get("confidence") is not None else {**row, "confidence": _extract_confidence(row.get("details"))}
+            for row in rows
+        ]
+        if not rows:
+            return []
+        violations = await self._insert(rows)
+        self._schedule_broadcast(violations)
+        return violations
+
+    def submit_threadsafe(self, row: Dict[str, Any]) -> Optional[concurrent.futures.Future]:
+        """
+        Queue a violation from a non-event-loop thread without waiting for it.
+
+        Returns None if the writer is not running.
+        """
+        loop = self.loop
+        if loop is None or self._stopping:
+            return None
+        return asyncio.run_coroutine_threadsafe(self.submit(row), loop)
+
+    async def _run(self) -> None:
+        loop = asyncio.get_running_loop()
+        stopping = False
+        while not stopping:
+            item = await self._queue.get()
+            if item is _STOP:
+                break
+
+            batch = [item]
+            deadline = loop.time() + self.max_delay
+            while len(batch) < self.max_batch_size:
+                try:
+                    item = self._queue.get_nowait()
+                except asyncio.QueueEmpty:
+                    timeout = deadline - loop.time()
+                    if timeout <= 0:
+                        break
+                    try:
+                        item = await asyncio.wait_for(self._queue.get(), timeout)
+                    except asyncio.TimeoutError:
+                        break
+                if item is _STOP:
+                    stopping = True
+                    break
+                batch.append(item)
+
+            try:
+                await self._flush(batch)
+            except Exception as exc:
+                logger.error(f"Violation writer flush failed: {exc}", exc_info=True)
+
+        # Anything that slipped in behind _STOP would otherwise wait forever
+        while True:
+            try:
+                item = self._queue.get_nowait()
+            except asyncio.QueueEmpty:
+                break
+            if item is not _STOP and not item[1].done():
+                item[1].set_exception(RuntimeError("Violation writer stopped before the row was written"))
+
+    async def _flush(self, batch: List[Tuple[Dict[str, Any], asyncio.Future]]) -> None:
+        rows = [row for row, _ in batch]
+        results: List[Union[Violation, Exception]]
+        try:
+            results = list(await self._insert(rows))
+        except Exception as exc:
+            if len(rows) == 1:
+                results = [exc]
+            else:
+                # Isolate the bad row(s) so one invalid event doesn't fail the whole batch.
+                logger.warning(f"Batch insert of {len(rows)} violations failed, retrying row by row: {exc}")
+                results = []
+                for row in rows:
+                    try:
+                        results.extend(await self._insert([row]))
+                    except Exception as row_exc:
+                        results.append(row_exc)
+
+        for (_, future), result in zip(batch, results):
+            if future.done():
+                continue  # Caller went away
+            if isinstance(result, Exception):
+                future.set_exception(result)
+            else:
+                future.set_result(result)
+
+        self._schedule_broadcast([result for result in results if isinstance(result, Violation)])
+
+    def _schedule_broadcast(self, violations: List[Violation]) -> None:
+        if not violations:
+            return
+        # Fire-and-forget: slow WebSocket clients must not hold up the next batch
+        task = asyncio.create_task(self._broadcast(violations))
+        self._broadcasts.add(task)
+        task.add_done_callback(self._broadcasts.discard)
+
+    async def _broadcast(self, violations: List[Violation]) -> None:
+        try:
+            await manager.broadcast_json(_violations_event(violations))
+        except Exception as exc:
+            logger.warning(f"Violation broadcast failed: {exc}")
+
+    async def _insert(self, rows: List[Dict[str, Any]]) -> List[Violation]:
+        # executemany with RETURNING is sent as one multi-VALUES INSERT per batch.
+        stmt = insert(Violation).returning(Violation, sort_by_parameter_order=True)
+        async with AsyncSessionLocal() as db:
+            result = await db.execute(stmt, rows)
+            violations = list(result.scalars())
+            await db.commit()
+        return violations
+
+
+violation_writer = ViolationWriter()
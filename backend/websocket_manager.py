@@ -1,29 +1,66 @@
+import asyncio
+import logging
+import orjson
 from fastapi import WebSocket
-from typing import List
+from typing import Any, Dict, Union
+
+logger = logging.getLogger(__name__)
+
+# Messages buffered per client; when a slow client falls this far behind, its
+# oldest pending message is dropped
+SEND_QUEUE_SIZE = 32
 
 class ConnectionManager:
     def __init__(self):
-        self.active_connections: List[WebSocket] = []
+        # Each client has its own send queue drained by its own writer task, so a
+        # slow socket only delays itself instead of every broadcast
+        self.active_connections: Dict[WebSocket, asyncio.Queue] = {}
+        self._writers: Dict[WebSocket, asyncio.Task] = {}
 
     async def connect(self, websocket: WebSocket):
         """Accept WebSocket connection and add to active connections"""
         await websocket.accept()
-        self.active_connections.append(websocket)
+        queue = asyncio.Queue(maxsize=SEND_QUEUE_SIZE)
+        self.active_connections[websocket] = queue
+        self._writers[websocket] = asyncio.create_task(self._writer(websocket, queue))
 
     def disconnect(self, websocket: WebSocket):
         """Remove WebSocket from active connections"""
+        self.active_connections.pop(websocket, None)
+        writer = self._writers.pop(websocket, None)
+        if writer is not None and writer is not asyncio.current_task():
+            writer.cancel()
+
+    async def broadcast_json(self, obj: Any):
+        """Serialize once with orjson and broadcast the bytes to every client"""
+        await self.broadcast(orjson.dumps(obj))
+
+    async def broadcast(self, message: Union[str, bytes]):
+        # Encode once and send the same payload to every client as a binary frame,
+        # instead of having the server UTF-8 encode the text per connection
+        payload = message.encode("utf-8") if isinstance(message, str) else message
+        event = {"type": "websocket.send", "bytes": payload}
+
+        dropped = 0
+        for queue in tuple(self.active_connections.values()):
+            if queue.full():
+                queue.get_nowait()
+                dropped += 1
+            queue.put_nowait(event)
+        if dropped:
+            logger.warning(f"{dropped} WebSocket client(s) falling behind, dropped their oldest message")
+        # Give the writers a turn so back-to-back broadcasts don't overflow the
+        # queues of clients that are keeping up
+        await asyncio.sleep(0)
+
+    async def _writer(self, websocket: WebSocket, queue: asyncio.Queue):
         try:
-            self.active_connections.remove(websocket)
-        except ValueError:
-            # WebSocket not in list, already disconnected
-            pass
-
-    async def broadcast(self, message: str):
-        for connection in self.active_connections:
-            try:
-                await connection.send_text(message)
-            except Exception:
-                # Handle disconnected clients gracefully
-                self.active_connections.remove(connection)
+            while True:
+                await websocket.send(await queue.get())
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            # Handle disconnected clients gracefully
+            self.disconnect(websocket)
 
 manager = ConnectionManager()
@@ -206,6 +206,9 @@ const Dashboard = () => {
         const wsUrl = `${wsProtocol}://${wsBase}/ws/violations`;
         
         const ws = new WebSocket(wsUrl);
+        // Broadcasts arrive as binary frames holding UTF-8 JSON
+        ws.binaryType = 'arraybuffer';
+        const decoder = new TextDecoder();
 
         ws.onopen = () => {
             console.log('Connected to violations WebSocket');
@@ -214,30 +217,42 @@ const Dashboard = () => {
 
         ws.onmessage = (event) => {
             try {
-                const message = JSON.parse(event.data);
-                if (message.type === 'violation') {
-                    const data = message.data;
-                    
-                    const detection = enhanceDetection(data);
-                    if (isUnknownDetection(detection)) {
+                const raw = typeof event.data === 'string' ? event.data : decoder.decode(event.data);
+                const message = JSON.parse(raw);
+                if (message.type === 'violations') {
+                    // One message per committed batch, oldest first; newest goes on top
+                    const newAlerts = [];
+                    const newDetections = [];
+                    for (const data of message.data) {
+                        const detection = enhanceDetection(data);
+                        if (isUnknownDetection(detection)) {
+                            newAlerts.unshift(detection);
+                        } else {
+                            newDetections.unshift(detection);
+                        }
+                    }
+
+                    if (newAlerts.length > 0) {
                         setAlerts(prev => {
-                            const exists = prev.some(d => d.id === detection.id);
-                            if (exists) return prev;
-                            return [detection, ...prev].slice(0, 1000);
+                            const seen = new Set(prev.map(d => d.id));
+                            const fresh = newAlerts.filter(d => !seen.has(d.id));
+                            if (fresh.length === 0) return prev;
+                            return [...fresh, ...prev].slice(0, 1000);
                         });
                         if (alertsDismissed || !isPanelOpen) {
-                            setUnreadAlerts((count) => count + 1);
+                            setUnreadAlerts((count) => count + newAlerts.length);
                         }
                         if (!alertsDismissed && !isPanelOpen) {
                             setIsPanelOpen(true);
                             setUnreadAlerts(0);
                         }
-                    } else {
+                    }
+                    if (newDetections.length > 0) {
                         setDetections(prev => {
-                            const exists = prev.some(d => d.id === detection.id);
-                            if (exists) return prev;
-                            const updated = [detection, ...prev];
-                            return updated.slice(0, 1000);
+                            const seen = new Set(prev.map(d => d.id));
+                            const fresh = newDetections.filter(d => !seen.has(d.id));
+                            if (fresh.length === 0) return prev;
+                            return [...fresh, ...prev].slice(0, 1000);
                         });
                     }
                 }
@@ -0,0 +1,89 @@
+import os
+import csv
+import queue
+import threading
+
+
+class AttendanceWriter:
+    """
+    Appends attendance rows to hourly CSV files on a background thread.
+
+    The inference loop only enqueues (name, date, time, camera_id); the writer
+    thread keeps the current hour's file open, drains every pending row, writes
+    them and flushes once, and switches files when a row belongs to a new hour.
+    """
+
+    HEADER = ["Name", "Date", "Time", "CameraID"]
+
+    def __init__(self, attendance_dir, max_pending=1024):
+        self.attendance_dir = attendance_dir
+        self._queue = queue.Queue(maxsize=max_pending)
+        self._file = None
+        self._writer = None
+        self._hour = None
+        self._thread = threading.Thread(target=self._run, daemon=True, name="AttendanceWriter")
+        self._thread.start()
+
+    def write(self, name, date, time_val, camera_id):
+        """Queue one attendance row. Returns False if the writer is saturated."""
+        try:
+            self._queue.put_nowait((name, date, time_val, camera_id))
+            return True
+        except queue.Full:
+            print(f"⚠️ Attendance writer queue full, dropping row for {name}")
+            return False
+
+    def close(self, timeout=2.0):
+        """Write everything still queued, then stop the writer thread."""
+        self._queue.put(None)
+        self._thread.join(timeout=timeout)
+
+    def _run(self):
+        running = True
+        while running:
+            row = self._queue.get()
+            if row is None:
+                break
+            rows = [row]
+            while True:
+                try:
+                    row = self._queue.get_nowait()
+                except queue.Empty:
+                    break
+                if row is None:
+                    running = False
+                    break
+                rows.append(row)
+            self._write_rows(rows)
+        self._close_file()
+
+    def _write_rows(self, rows):
+        try:
+            for row in rows:
+                # "YYYY-MM-DD" + "_HH" from the row itself, so rows land in the
+                # hour they were detected in
+                hour = f"{row[1]}_{row[2][:2]}"
+                if hour != self._hour:
+                    self._open(hour)
+                self._writer.writerow(row)
+            self._file.flush()
+        except Exception as e:
+            print(f"Error logging attendance: {e}")
+
+    def _open(self, hour):
+        self._close_file()
+        os.makedirs(self.attendance_dir, exist_ok=True)
+        path = os.path.join(self.attendance_dir, f"attendance_{hour}-00.csv")
+        is_new = not os.path.exists(path)
+        self._file = open(path, "a", newline="")
+        self._writer = csv.writer(self._file)
+        self._hour = hour
+        if is_new:
+            self._writer.writerow(self.HEADER)
+
+    def _close_file(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+            self._writer = None
+            self._hour = None
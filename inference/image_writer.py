@@ -0,0 +1,92 @@
+import os
+import cv2
+import queue
+import threading
+
+try:
+    # Optional: libjpeg-turbo's SIMD encoder, several times faster than cv2.imencode
+    from turbojpeg import TurboJPEG, TJPF_BGR, TJSAMP_420
+    _tj = TurboJPEG()
+except Exception:  # PyTurboJPEG or the libjpeg-turbo shared library is missing
+    _tj = None
+
+# Same as cv2.imwrite's default, so crops look the same with either encoder
+JPEG_QUALITY = 95
+
+
+class BatchedImageWriter:
+    """
+    Encodes and writes face crops on a background thread.
+
+    The inference loop only enqueues (path, image); the writer thread wakes once,
+    drains up to `max_batch` pending crops and writes them all before sleeping
+    again, so a burst of faces costs one wake-up instead of one blocking
+    encode+write per face on the camera thread.
+    """
+
+    def __init__(self, max_batch=64, max_pending=256):
+        self.max_batch = max_batch
+        self._queue = queue.Queue(maxsize=max_pending)
+        self._thread = threading.Thread(target=self._run, daemon=True, name="ImageWriter")
+        self._thread.start()
+
+    def write(self, path, img):
+        """Queue an image for writing. When saturated, the oldest pending crop is dropped."""
+        while True:
+            try:
+                self._queue.put_nowait((path, img))
+                return True
+            except queue.Full:
+                try:
+                    dropped = self._queue.get_nowait()
+                except queue.Empty:
+                    continue
+                if dropped is None:
+                    # Never drop the close() sentinel
+                    self._queue.put(dropped)
+                    return False
+                print(f"⚠️ Image writer queue full, dropping {os.path.basename(dropped[0])}")
+
+    def close(self, timeout=2.0):
+        """Write everything still queued, then stop the writer thread."""
+        self._queue.put(None)
+        self._thread.join(timeout=timeout)
+
+    def _run(self):
+        running = True
+        while running:
+            item = self._queue.get()
+            if item is None:
+                break
+            batch = [item]
+            while len(batch) < self.max_batch:
+                try:
+                    item = self._queue.get_nowait()
+                except queue.Empty:
+                    break
+                if item is None:
+                    running = False
+                    break
+                batch.append(item)
+            self._write_batch(batch)
+
+    def _write_batch(self, batch):
+        for path, img in batch:
+            try:
+                buf = self._encode(img)
+                if buf is None:
+                    print(f"Error encoding crop: {path}")
+                    continue
+                # Write to a temp name and rename so readers never see a partial file
+                tmp_path = f"{path}.tmp"
+                with open(tmp_path, "wb") as f:
+                    f.write(buf)
+                os.replace(tmp_path, path)
+            except Exception as e:
+                print(f"Error saving crop: {e}")
+
+    def _encode(self, img):
+        if _tj is not None:
+            return _tj.encode(img, quality=JPEG_QUALITY, pixel_format=TJPF_BGR, jpeg_subsample=TJSAMP_420)
+        ok, buf = cv2.imencode(".jpg", img, [cv2.IMWRITE_JPEG_QUALITY, JPEG_QUALITY])
+        return buf if ok else None
@@ -1,13 +1,46 @@
 import os
 import json
-import requests
+import httpx
+import orjson
+import queue
+import signal
+import threading
 import time
+from concurrent.futures import ThreadPoolExecutor
+from .params import Params
 from .processor import FaceRecognitionProcessor
 
 # Configuration
 BACKEND_URL = os.getenv("BACKEND_URL", "http://localhost:8000")
 CONFIG_PATH = os.path.join(os.path.dirname(__file__), "config.json")
 
+# Pooled keep-alive client shared by the sender workers, so violations reuse
+# connections instead of a new TCP handshake per POST. HTTP/2 (negotiated over
+# TLS) multiplexes concurrent POSTs on one connection; the transport retries
+# connection failures only, never a POST that was already sent.
+CLIENT = httpx.Client(
+    timeout=2.0,
+    limits=httpx.Limits(max_connections=8, max_keepalive_connections=8),
+    transport=httpx.HTTPTransport(http2=True, retries=2),
+)
+
+# Batches are POSTed by a small pool so one slow round-trip doesn't stall the
+# queue; at most MAX_IN_FLIGHT batches are submitted or sending at once.
+SEND_WORKERS = 4
+MAX_IN_FLIGHT = 8
+SEND_POOL = ThreadPoolExecutor(max_workers=SEND_WORKERS, thread_name_prefix="ViolationPost")
+_in_flight = threading.BoundedSemaphore(MAX_IN_FLIGHT)
+
+# Violations waiting to be sent; the camera threads never block on the network
+VIOLATION_QUEUE = queue.Queue(maxsize=1024)
+
+# The sender posts up to BATCH_SIZE violations at once, waiting at most
+# BATCH_WINDOW seconds after the first one for more to arrive
+BATCH_SIZE = 32
+BATCH_WINDOW = 0.1
+
+JSON_HEADERS = {"Content-Type": "application/json"}
+
 def on_violation(data):
     """Callback when a face is detected/violation occurred"""
     # data: {camera_id, type, name, confidence, timestamp, bbox, image_filename}
@@ -29,11 +62,55 @@ def on_violation(data):
     }
     
     try:
-        resp = requests.post(f"{BACKEND_URL}/api/violations/", json=payload)
+        VIOLATION_QUEUE.put_nowait(payload)
+    except queue.Full:
+        print(f"Violation queue full, dropping detection: {data['name']}")
+
+def collect_batch():
+    """Block for one queued violation, then gather more until the batch window closes"""
+    batch = [VIOLATION_QUEUE.get()]
+    deadline = time.monotonic() + BATCH_WINDOW
+    while len(batch) < BATCH_SIZE:
+        timeout = deadline - time.monotonic()
+        if timeout <= 0:
+            break
+        try:
+            batch.append(VIOLATION_QUEUE.get(timeout=timeout))
+        except queue.Empty:
+            break
+    return batch
+
+def post_batch(batch):
+    """POST one batch of violations to the backend"""
+    try:
+        # orjson handles the numpy scalars/arrays in detection details natively
+        if len(batch) == 1:
+            url = f"{BACKEND_URL}/api/violations/"
+            body = orjson.dumps(batch[0], option=orjson.OPT_SERIALIZE_NUMPY)
+        else:
+            url = f"{BACKEND_URL}/api/violations/batch"
+            body = orjson.dumps(batch, option=orjson.OPT_SERIALIZE_NUMPY)
+        resp = CLIENT.post(url, content=body, headers=JSON_HEADERS)
         if resp.status_code != 200:
-            print(f"Failed to push violation: {resp.text}")
+            print(f"Failed to push {len(batch)} violation(s): {resp.text}")
     except Exception as e:
         print(f"Error communicating with backend: {e}")
+    finally:
+        _in_flight.release()
+
+def send_violations():
+    """Background sender: batch queued violations and hand them to the POST pool"""
+    while True:
+        batch = collect_batch()
+        _in_flight.acquire()
+        SEND_POOL.submit(post_batch, batch)
+
+def warm_up_backend():
+    """Resolve DNS and open a pooled connection before the first detection needs it"""
+    try:
+        CLIENT.get(f"{BACKEND_URL}/health")
+    except Exception as e:
+        print(f"Backend not reachable yet ({e}); violations will be sent once it is")
 
 def main():
     # 1. Load Config
@@ -43,6 +120,7 @@ def main():
         
     with open(CONFIG_PATH, "r") as f:
         config = json.load(f)
+    params = Params.from_dict(config["parameters"])
         
     # 2. Setup Camera (Env Override > Config)
     # We want to run for C1 specifically for the demo
@@ -57,18 +135,24 @@ def main():
     
     # 3. Initialize Processor
     processor = FaceRecognitionProcessor(
-        parameters=config["parameters"],
+        parameters=params,
         cameras=cameras,
         on_violation=on_violation
     )
     
     # 4. Run
+    warm_up_backend()
+    threading.Thread(target=send_violations, daemon=True, name="ViolationSender").start()
+    stop_event = threading.Event()
+    # Treat SIGTERM (docker stop, systemd) like Ctrl-C
+    signal.signal(signal.SIGTERM, lambda *_: stop_event.set())
     try:
         processor.start()
-        # Since start() in my implementation spawns threads and returns, keep main alive
-        while True:
-            time.sleep(1)
+        # start() spawns the camera threads and returns; block until asked to stop
+        stop_event.wait()
     except KeyboardInterrupt:
+        pass
+    finally:
         print("Stopping...")
         processor.stop()
 
@@ -0,0 +1,41 @@
+from dataclasses import dataclass, fields
+
+
+@dataclass(frozen=True, slots=True)
+class Params:
+    """
+    Processor settings parsed once from config.json's "parameters" block.
+
+    Frozen so one instance can be shared by every camera thread; the hot loop
+    reads plain attributes instead of hashing dict keys per frame.
+    """
+
+    yolo_model_path: str
+    facenet_model_path: str
+    db_json_path: str
+    save_matched_dir: str = "matched_faces"
+    save_unknown_dir: str = "unknown_faces"
+    attendance_dir: str = "attendance_logs"
+    reconnect_delay: float = 5
+    max_failures: int = 10
+    min_face_size: int = 80
+    threshold: float = 0.6
+    required_confirmations: int = 3
+    unknown_interval: float = 30
+    re_id_interval: int = 30  # frames a confirmed face track skips FaceNet before re-checking
+    track_ttl: int = 15  # frames a face track survives without a matching box
+    det_imgsz: int = 640
+    det_conf: float = 0.25
+    hw_decode: bool = True  # ask FFmpeg for NVDEC/VAAPI/QSV decode, software if unavailable
+    cuda_graph_batch: int = 8  # faces per CUDA graph replay; 0 disables the graph
+    use_compile: bool = False  # torch.compile (CUDA) / TorchScript freeze (CPU) FaceNet
+    facenet_onnx_path: str = ""  # FaceNet exported by scripts/export_onnx.py; runs on ONNX Runtime
+
+    @classmethod
+    def from_dict(cls, parameters):
+        """Build Params from a config dict, ignoring (and reporting) unknown keys."""
+        known = {f.name for f in fields(cls)}
+        unknown = sorted(set(parameters) - known)
+        if unknown:
+            print(f"⚠️ Ignoring unknown parameters: {', '.join(unknown)}")
+        return cls(**{key: value for key, value in parameters.items() if key in known})
@@ -0,0 +1,75 @@
+import sys
+import os
+# Add project root to path so the inference package is found
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+import argparse
+import dataclasses
+import json
+import torch
+from ultralytics import YOLO
+from inference.params import Params
+from inference.processor import FaceRecognitionProcessor
+
+INFERENCE_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "inference"))
+CONFIG_PATH = os.path.join(INFERENCE_DIR, "config.json")
+# The processor resolves relative model paths against inference/
+FACENET_OUT = os.path.join(INFERENCE_DIR, "facenet.onnx")
+
+def export_facenet(params, output_path):
+    """Export the configured FaceNet (custom weights included) with a dynamic batch axis"""
+    output_path = os.path.abspath(output_path)
+    # Export the eager module, never a compiled/traced one
+    processor = FaceRecognitionProcessor(
+        parameters=dataclasses.replace(params, use_compile=False),
+        cameras={}
+    )
+    processor.load_face_encoder()
+    # Export float32 NCHW; the processor converts FaceNet to fp16 channels_last on CUDA
+    encoder = processor.face_encoder.float().to(memory_format=torch.contiguous_format)
+    example = torch.randn(8, 3, 160, 160, device=processor.device)
+    torch.onnx.export(
+        encoder,
+        example,
+        output_path,
+        input_names=["x"],
+        output_names=["embedding"],
+        dynamic_axes={"x": {0: "N"}, "embedding": {0: "N"}},
+        opset_version=17,
+    )
+    print(f"✓ FaceNet exported to {output_path}")
+    print(f'  Set "facenet_onnx_path": "{output_path}" in config.json to use it')
+
+def export_yolo(params, fmt):
+    """Export the YOLO face detector; point yolo_model_path at the result to use it"""
+    processor = FaceRecognitionProcessor(parameters=params, cameras={})
+    yolo_path = processor._resolve_path(params.yolo_model_path)
+    if not os.path.exists(yolo_path):
+        yolo_path = params.yolo_model_path
+    # TensorRT engines need a GPU and are built for fp16 there
+    half = fmt == "engine"
+    exported = YOLO(yolo_path).export(format=fmt, half=half, imgsz=params.det_imgsz)
+    print(f"✓ YOLO exported to {exported}")
+    print(f'  Set "yolo_model_path": "{exported}" in config.json to use it')
+
+def main():
+    parser = argparse.ArgumentParser(description="Export the inference models for ONNX Runtime / TensorRT")
+    parser.add_argument("--config", default=CONFIG_PATH, help="Path to inference config.json")
+    parser.add_argument("--facenet-out", default=FACENET_OUT, help="Output path for the FaceNet ONNX model")
+    parser.add_argument(
+        "--yolo-format",
+        choices=["onnx", "engine", "none"],
+        default="onnx",
+        help="YOLO export format (engine = TensorRT, requires a GPU)"
+    )
+    args = parser.parse_args()
+
+    with open(args.config, "r") as f:
+        params = Params.from_dict(json.load(f)["parameters"])
+
+    export_facenet(params, args.facenet_out)
+    if args.yolo_format != "none":
+        export_yolo(params, args.yolo_format)
+
+if __name__ == "__main__":
+    main()